@@ -1,19 +1,29 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set, Tuple, BinaryIO, Iterator
 import textwrap
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import functools
+import itertools
+import threading
 import os.path
+import time
 import pickle as pkl
-from time import sleep
-from random import randint
-import json
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError, URLError
+import asyncio
+import re
+from urllib.parse import quote
+import numpy as np
+import aiohttp
 import requests
+import orjson
+import ijson
+from aiolimiter import AsyncLimiter
 from playsound import playsound
-from bs4 import BeautifulSoup as Soup
-from forex_python.converter import CurrencyRates
+
+try:
+    import msgpack
+except ImportError:  # price history falls back to pickle when msgpack isn't installed
+    msgpack = None
 
 
 class ItemNotFound(Exception):  # Custom error
@@ -23,6 +33,13 @@ class ItemNotFound(Exception):  # Custom error
         super().__init__(self.message)
 
 
+class RequestFailed(Exception):  # Custom error
+    def __init__(self, description) -> None:
+        self.description = description
+        self.message = f"failed while trying to get {description}"
+        super().__init__(self.message)
+
+
 # Item dataclasses
 @dataclass
 class SteamPrice:
@@ -36,6 +53,13 @@ class SteamPrice:
     volume: int
     date: datetime
     url: str
+    date_ord: int = field(init=False, repr=False, compare=False)
+    taxed_price: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # integer date for cheap up to date checks
+        self.date_ord = self.date.toordinal()
+        self.taxed_price = tax_calculation(self.lowest_price)
 
 
 @dataclass
@@ -67,80 +91,346 @@ class PriceHistory:
     class containing the steam price history of items to save time by skiping price requests for items that are up to date
     """
 
-    def __init__(self, price_history_file_path: str, up_to_date_days: int = 3) -> None:
+    def __init__(
+        self,
+        price_history_file_path: str,
+        up_to_date_days: int = 3,
+        max_journal_size: int = 8 * 1024 * 1024,
+    ) -> None:
         """
         args:
             price_history_file_path : str
-                path to price history file (must be a .pkl file)
+                path to price history file (numpy .npz archive)
+                updates are journaled to the same path with a .msgpack.log suffix, or .pickle.log if msgpack is not installed
             up_to_date_days :
                 days that items are considered up to date
+            max_journal_size : int = 8 MB
+                journal size in bytes after which it is compacted into the price history file
         """
-        self.today = datetime.today()
+        self._today_ord = date.today().toordinal()
         self.price_history_file_path = price_history_file_path
+        self.journal_file_path = _journal_file_path(
+            price_history_file_path, msgpack is not None
+        )
         self.up_to_date_days = up_to_date_days
+        self.max_journal_size = max_journal_size
         self.load_data()
+        self._journal = open(self.journal_file_path, "ab")
+        # journal left by a run with msgpack installed or missing, folded in so only one journal format is appended to
+        other_journal_file_path = _journal_file_path(
+            price_history_file_path, msgpack is None
+        )
+        if os.path.exists(other_journal_file_path):
+            self.save_data()
+            os.remove(other_journal_file_path)
 
     def load_data(self) -> None:
         """
-        loads price history data from file
+        loads price history data from file and replays updates journaled since it was saved
+
+        prices are kept as a struct of arrays, one entry per item at the index stored in self._idx,
+        items steam had no price for have a NaN lowest price,
+        the taxed price is kept in full precision so comparisons don't have to build a SteamPrice
         """
-        if not os.path.exists(self.price_history_file_path):
-            self.data = {}
-            self.save_data()
-        else:
-            with open(self.price_history_file_path, "rb") as p:
-                self.data = pkl.load(p)
+        self._idx: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._urls: List[str] = []
+        self._lowest = np.empty(0, np.float32)
+        self._taxed = np.empty(0, np.float64)
+        self._median = np.empty(0, np.float32)
+        self._volume = np.empty(0, np.int32)
+        self._date_ord = np.empty(0, np.int32)
+
+        if os.path.exists(self.price_history_file_path):
+            with np.load(self.price_history_file_path) as snapshot:
+                self._names = snapshot["names"].tolist()
+                self._urls = snapshot["urls"].tolist()
+                self._lowest = snapshot["lowest"]
+                self._taxed = snapshot["taxed"]
+                self._median = snapshot["median"]
+                self._volume = snapshot["volume"]
+                self._date_ord = snapshot["date_ord"]
+            self._idx = {name: idx for idx, name in enumerate(self._names)}
+
+        journals = []
+        for use_msgpack in (False, True):
+            path = _journal_file_path(self.price_history_file_path, use_msgpack)
+            if os.path.exists(path) and os.path.getsize(path):
+                if use_msgpack and not msgpack:
+                    raise ImportError(
+                        f"{path} was written with msgpack, install msgpack to load it"
+                    )
+                journals.append((os.path.getmtime(path), path, use_msgpack))
+
+        # oldest first so the latest updates win when both journals exist
+        for _, path, use_msgpack in sorted(journals):
+            with open(path, "r+b") as j:
+                valid_size = 0
+                for record, valid_size in _load_records(j, use_msgpack):
+                    self._store(*_unpack_steam_price(record))
+                # cuts off a partially written last record, otherwise new updates would be appended after it and lost
+                if os.path.getsize(path) > valid_size:
+                    j.truncate(valid_size)
 
     def save_data(self) -> None:
         """
-        saves price history to file
+        saves price history to file and empties the journal,
+        writes to a temporary file first so a crash can't corrupt the history
+        """
+        size = len(self._names)
+        tmp_path = self.price_history_file_path + ".tmp"
+        with open(tmp_path, "wb") as p:
+            np.savez_compressed(
+                p,
+                names=np.array(self._names, dtype=str),
+                urls=np.array(self._urls, dtype=str),
+                lowest=self._lowest[:size],
+                taxed=self._taxed[:size],
+                median=self._median[:size],
+                volume=self._volume[:size],
+                date_ord=self._date_ord[:size],
+            )
+        os.replace(tmp_path, self.price_history_file_path)
+        self._journal.truncate(0)
+
+    def close(self) -> None:
+        """
+        closes the journal
         """
-        with open(self.price_history_file_path, "wb") as p:
-            pkl.dump(self.data, p)
+        self._journal.close()
 
-    def update_data(self, name: str, SteamPrice) -> None:
+    def __enter__(self) -> "PriceHistory":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def import_pickle(self, pickle_file_path: str) -> None:
         """
-        updates price of item
+        imports a price history saved by older versions (a pickled dict of SteamPrice) and saves it,
+        only import files you trust since loading pickle can execute code
         """
-        self.data[name] = SteamPrice
+        with open(pickle_file_path, "rb") as p:
+            data = _LegacyUnpickler(p).load()
+        for name, steam_price in data.items():
+            if steam_price:
+                # rebuilt so fields added since the file was written are computed
+                steam_price = SteamPrice(
+                    name=steam_price.name,
+                    lowest_price=steam_price.lowest_price,
+                    median_price=steam_price.median_price,
+                    volume=steam_price.volume,
+                    date=steam_price.date,
+                    url=steam_price.url,
+                )
+            self._store(name, steam_price)
+        self.save_data()
 
-    def get_item_info(self, name: str) -> SteamPrice:
+    def update_data(self, name: str, steam_price: Optional[SteamPrice]) -> None:
+        """
+        updates price of item and appends the update to the journal
+        """
+        self._store(name, steam_price)
+        _dump_record(_pack_steam_price(name, steam_price), self._journal)
+        self._journal.flush()
+        if self._journal.tell() > self.max_journal_size:
+            self.save_data()
+
+    def _store(self, name: str, steam_price: Optional[SteamPrice]) -> None:
+        """
+        writes price of item into the arrays, growing them when they are full
+        """
+        idx = self._idx.get(name)
+        if idx is None:
+            idx = len(self._names)
+            if idx == len(self._lowest):
+                capacity = max(1024, 2 * idx)
+                self._lowest = np.resize(self._lowest, capacity)
+                self._taxed = np.resize(self._taxed, capacity)
+                self._median = np.resize(self._median, capacity)
+                self._volume = np.resize(self._volume, capacity)
+                self._date_ord = np.resize(self._date_ord, capacity)
+            self._idx[name] = idx
+            self._names.append(name)
+            self._urls.append("")
+
+        if steam_price is None:
+            self._lowest[idx] = np.nan
+            self._taxed[idx] = np.nan
+            self._median[idx] = 0
+            self._volume[idx] = 0
+            self._date_ord[idx] = 0
+            self._urls[idx] = ""
+        else:
+            self._lowest[idx] = steam_price.lowest_price
+            self._taxed[idx] = steam_price.taxed_price
+            self._median[idx] = steam_price.median_price
+            self._volume[idx] = steam_price.volume
+            self._date_ord[idx] = steam_price.date_ord
+            self._urls[idx] = steam_price.url
+
+    def get_item_info(self, name: str) -> Optional[SteamPrice]:
         """
         gets information on item
         """
-        if name not in self.data:
+        idx = self._idx.get(name)
+        if idx is None:
             raise ItemNotFound(name)
-        return self.data[name]
+        lowest_price = self._lowest[idx]
+        if np.isnan(lowest_price):
+            return None
+        return SteamPrice(
+            name=name,
+            lowest_price=round(float(lowest_price), 2),
+            median_price=round(float(self._median[idx]), 2),
+            volume=int(self._volume[idx]),
+            date=datetime.fromordinal(int(self._date_ord[idx])),
+            url=self._urls[idx],
+        )
+
+    def get_taxed_price(self, name: str) -> Optional[float]:
+        """
+        gets price of item after taxes, None if steam had no price for it
+        """
+        idx = self._idx.get(name)
+        if idx is None:
+            raise ItemNotFound(name)
+        taxed_price = self._taxed[idx]
+        if np.isnan(taxed_price):
+            return None
+        return float(taxed_price)
 
     def check_exists(self, name: str) -> bool:
         """
         checks if item exists in price history
         """
-        if name not in self.data:
-            return False
-        return True
+        return name in self._idx
 
     def check_up_to_date(self, name: str) -> bool:
         """
         check if item price is updated
         """
-        if self.data[name]:
-            if (self.today - self.data[name].date).days > self.up_to_date_days:
-                return False
-            else:
-                return True
-        else:
-            return True
+        return self._is_up_to_date(self._idx[name])
 
     def check_item(self, name: str) -> bool:
         """
         check if item exists and is up to date
         """
-        if not self.check_exists(name):
-            return False
-        if not self.check_up_to_date(name):
-            return False
-        return True
+        idx = self._idx.get(name)
+        return idx is not None and self._is_up_to_date(idx)
+
+    def _is_up_to_date(self, idx: int) -> bool:
+        """
+        check if item at index is up to date, items steam had no price for count as up to date
+        """
+        return bool(
+            np.isnan(self._lowest[idx])
+            or self._today_ord - self._date_ord[idx] <= self.up_to_date_days
+        )
+
+    def fresh_names_snapshot(self) -> Set[str]:
+        """
+        gets names of all items that exist and are up to date
+        """
+        size = len(self._names)
+        fresh = np.isnan(self._lowest[:size]) | (
+            self._today_ord - self._date_ord[:size] <= self.up_to_date_days
+        )
+        return set(itertools.compress(self._names, fresh.tolist()))
+
+
+def _pack_steam_price(name: str, steam_price: Optional[SteamPrice]) -> tuple:
+    """
+    converts item price to a plain tuple for serialization, items without a steam price are stored as only their name
+    """
+    if steam_price is None:
+        return (name,)
+    return (
+        name,
+        steam_price.name,
+        steam_price.lowest_price,
+        steam_price.median_price,
+        steam_price.volume,
+        int(steam_price.date.timestamp()),
+        steam_price.url,
+    )
+
+
+def _unpack_steam_price(record: list) -> Tuple[str, Optional[SteamPrice]]:
+    """
+    reverse of _pack_steam_price
+    """
+    name, *fields = record
+    if not fields:
+        return name, None
+    item_name, lowest_price, median_price, volume, timestamp, url = fields
+    return name, SteamPrice(
+        name=item_name,
+        lowest_price=lowest_price,
+        median_price=median_price,
+        volume=volume,
+        date=datetime.fromtimestamp(timestamp),
+        url=url,
+    )
+
+
+def _journal_file_path(price_history_file_path: str, use_msgpack: bool) -> str:
+    """
+    path of the journal, the suffix tells which format it was written in
+    """
+    return price_history_file_path + (".msgpack.log" if use_msgpack else ".pickle.log")
+
+
+def _dump_record(record: tuple, file: BinaryIO) -> None:
+    """
+    appends a single record to file
+    """
+    if msgpack:
+        file.write(msgpack.packb(record, use_bin_type=True))
+    else:
+        pkl.dump(record, file, protocol=pkl.HIGHEST_PROTOCOL)
+
+
+def _load_records(file: BinaryIO, use_msgpack: bool) -> Iterator[Tuple[tuple, int]]:
+    """
+    reads records appended with _dump_record together with the file offset right after each record,
+    a partially written last record is skipped, any other malformed data raises
+    """
+    if use_msgpack:
+        unpacker = msgpack.Unpacker(file, raw=False)
+        for record in unpacker:
+            yield record, unpacker.tell()
+    else:
+        while True:
+            try:
+                record = pkl.load(file)
+            except EOFError:
+                return
+            except pkl.UnpicklingError as error:
+                if "truncated" not in str(error):
+                    raise
+                return
+            yield record, file.tell()
+
+
+class _LegacyUnpickler(pkl.Unpickler):
+    """
+    unpickler for price histories saved by older versions, those reference SteamPrice by the module it was pickled from
+    which is __main__ when saved by running Scraper.py directly
+    """
+
+    def find_class(self, module: str, name: str):
+        if module in ("__main__", "Scraper") and name == "SteamPrice":
+            return SteamPrice
+        return super().find_class(module, name)
+
+
+# symbols stripped from steam price strings, see SteamMarket._filter_string_price
+_PRICE_ARTIFACT_RE = re.compile(r"--|â‚¬")
+_PRICE_STRIP = str.maketrans("", "", "€,$. ")
+
+
+_STEAM_URL = "https://steamcommunity.com/market/priceoverview/?appid=252490&currency=3&market_hash_name={}"
 
 
 class SteamMarket:
@@ -148,47 +438,92 @@ class SteamMarket:
     class that stores functions for retrieving steam price
     """
 
-    def __init__(self) -> None:
+    steam_url = _STEAM_URL
+
+    def __init__(self, max_rate: float = 20) -> None:
+        """
+        args:
+            max_rate : float = 20
+                maximum number of price requests per minute
+        """
         self.today = datetime.today()
-        self.steam_url = "https://steamcommunity.com/market/priceoverview/?appid=252490&currency=3&market_hash_name={}"
+        # spread evenly over the minute, bursts of max_rate requests get answered with 429
+        self.limiter = AsyncLimiter(1, 60 / max_rate)
 
-    def get_steam_price(self, name: str) -> Optional[SteamPrice]:
+    async def get_steam_price(
+        self, session: aiohttp.ClientSession, name: str
+    ) -> Optional[SteamPrice]:
         """
-        function to get price data of item from steam
+        function to get price data of item from steam,
+        returns None if steam has no price for the item and raises RequestFailed if steam couldn't be reached
+
+        prices are requested one item at a time, steam's market search (search/render) can't batch them:
+        its query is a full text search that rarely returns the exact items asked for and its prices are always in USD
+        """
+        steam_json = await self._get_json(
+            session,
+            self.steam_url.format(_encode_url_string(name)),
+            f'price for item: "{name}"',
+        )
+        if steam_json["success"]:
+            return self._parse_price_info(steam_json, name)
+        return None
+
+    async def _get_json(
+        self, session: aiohttp.ClientSession, url: str, description: str
+    ) -> dict:
+        """
+        function to get json from steam, rate limited and server errors are retried with exponential backoff,
+        raises RequestFailed if steam couldn't be reached or kept answering with an error
         """
-        page_html = None
-        uClient = None
         for atempt in range(3):
             try:
-                uClient = urlopen(self.steam_url.format(_encode_url_string(name)))
-                page_html = uClient.read()
-                break
+                async with self.limiter:
+                    async with session.get(url) as response:
+                        body = await response.read()
+                        if response.status < 400:
+                            return orjson.loads(body)
+                        # steam answers items it doesn't know with an error status and {"success": false}
+                        try:
+                            steam_json = orjson.loads(body)
+                        except orjson.JSONDecodeError:
+                            steam_json = None
+                        if isinstance(steam_json, dict) and "success" in steam_json:
+                            return steam_json
+                        response.raise_for_status()
+
+            except aiohttp.ClientResponseError as error:
+                retryable = error.status == 429 or error.status >= 500
+                if atempt >= 2 or not retryable:
+                    print(
+                        textwrap.dedent(
+                            f"""\
+                        failed while trying to get {description}
+                        error code: {error.status},
+                        reason - {error.message}
+                        """
+                        )
+                    )
+                    raise RequestFailed(description) from error
+                else:
+                    await asyncio.sleep(_retry_delay(error, atempt))
+                    continue
 
-            except HTTPError as error:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # timeouts, connection resets and dns failures
                 if atempt >= 2:
                     print(
                         textwrap.dedent(
                             f"""\
-                        failed while trying to get price for item: "{name}"
-                        error code: {error.code},
-                        reason - {error.reason}
+                        failed while trying to get {description}
+                        reason - {error!r}
                         """
                         )
                     )
+                    raise RequestFailed(description) from error
                 else:
-                    sleep(1)
+                    await asyncio.sleep(_retry_delay(error, atempt))
                     continue
-            finally:
-                if uClient:
-                    uClient.close()
-
-        if page_html:
-            page_soup = Soup(page_html, "html.parser")
-            steam_json = json.loads(page_soup.getText())
-            if not steam_json["success"]:
-                return None
-            return self._parse_price_info(steam_json, name)
-        return None
 
     def _parse_price_info(self, json_info: dict, name: str) -> SteamPrice:
         """
@@ -219,34 +554,108 @@ class SteamMarket:
         """
         function to filter out symbols from price in steam json
         """
-        char_list = ["€", ",", "--", "â‚¬", " ", "$", "."]
-        for char in char_list:
-            string = string.replace(char, "")
-        return string.strip()
+        return _PRICE_ARTIFACT_RE.sub("", string).translate(_PRICE_STRIP).strip()
+
+
+def _retry_delay(error: Exception, atempt: int) -> float:
+    """
+    seconds to wait before retrying a failed request,
+    rate limited requests wait as long as the server's Retry-After header asks, others back off exponentially
+    """
+    if (
+        isinstance(error, aiohttp.ClientResponseError)
+        and error.status == 429
+        and error.headers
+        and "Retry-After" in error.headers
+    ):
+        try:
+            return float(error.headers["Retry-After"])
+        except ValueError:  # Retry-After can also be a http date
+            pass
+    return 2**atempt
 
 
+@functools.lru_cache(maxsize=50_000)
 def _encode_url_string(string: str) -> str:
     """
-    function for url encoding
+    function for url encoding, cached since the same item names are encoded over and over
     """
-    maping = {" ": "%20", "'": "%27", "&": "%26", "é": "%C3%A9"}
-    for k, v in maping.items():
-        string = string.replace(k, v)
-    return string
+    return quote(string, safe="")
 
 
 # Third party market scraper classes
 class ThirdPartyMarket(ABC):
     @abstractmethod
-    def get_page_items(self, page):
+    async def get_page_items(self, session: aiohttp.ClientSession, page: int):
         pass
 
 
+_RATES_URL = "https://open.er-api.com/v6/latest/{}"
+_RATES_CACHE_PATH = "fx.json"
+_RATES_CACHE_TTL = 24 * 60 * 60  # seconds
+# used when the currency rates api can't be reached
+_FALLBACK_RATES = {("USD", "EUR"): 0.92}
+
+
+def _get_rates(base_currency: str) -> Dict[str, float]:
+    """
+    gets all conversion rates from base currency, the api response is cached on disk for a day
+    """
+    if (
+        os.path.exists(_RATES_CACHE_PATH)
+        and time.time() - os.path.getmtime(_RATES_CACHE_PATH) < _RATES_CACHE_TTL
+    ):
+        try:
+            with open(_RATES_CACHE_PATH, "rb") as f:
+                cached = orjson.loads(f.read())
+            if cached["base_code"] == base_currency:
+                return cached["rates"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # a corrupt cache counts as a miss
+
+    response = requests.get(_RATES_URL.format(base_currency), timeout=5)
+    response.raise_for_status()
+    rates_json = orjson.loads(response.content)
+    if rates_json["result"] != "success":
+        raise ValueError(f"currency rates api returned {rates_json['result']}")
+    tmp_path = _RATES_CACHE_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, _RATES_CACHE_PATH)
+    return rates_json["rates"]
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_rate(from_currency: str, to_currency: str, day: int) -> float:
+    """
+    gets currency conversion rate, cached per day (day is a date ordinal) so it's requested at most once a day
+    """
+    try:
+        return _get_rates(from_currency)[to_currency]
+    except Exception as exc:
+        print(
+            f"failed getting {from_currency}/{to_currency} rate, using fallback rate - {exc}"
+        )
+        return _FALLBACK_RATES[from_currency, to_currency]
+
+
+_CSDEALS_URL = "https://cs.deals/ajax/marketplace-search"
+_CSDEALS_HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.84 Safari/537.36 OPR/85.0.4341.65",
+    "x-requested-with": "XMLHttpRequest",
+    "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+}
+_CSDEALS_FORM = {"appid": 252490, "sort": "discount", "sort_desc": 1}
+
+
 class CSDeals(ThirdPartyMarket):
     """
     scraper class for https://cs.deals
     """
 
+    url = _CSDEALS_URL
+    headers = _CSDEALS_HEADERS
+
     def __init__(self, min_price: float = 2.0, max_price: float = 100.0):
         """
         args:
@@ -255,50 +664,84 @@ class CSDeals(ThirdPartyMarket):
             max_price : float = 100.0
                 maximum price for item to show
         """
-        self.url = "https://cs.deals/ajax/marketplace-search"
-        self.headers = {
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.84 Safari/537.36 OPR/85.0.4341.65",
-            "x-requested-with": "XMLHttpRequest",
-            "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-        }
-        self.form_data = {"appid": 252490, "sort": "discount", "sort_desc": 1}
-        self.conversion_rate = CurrencyRates().get_rate("USD", "EUR")
+        # copied so sorting can be changed per instance
+        self.form_data = dict(_CSDEALS_FORM)
+        self.conversion_rate = _cached_rate("USD", "EUR", date.today().toordinal())
         self.min_price = min_price
         self.max_price = max_price
 
-    def get_page_items(self, page: int) -> Optional[List[SkinportItem]]:
+    async def get_page_items(
+        self, session: aiohttp.ClientSession, page: int
+    ) -> Optional[List[CSDealsItem]]:
         """
         retrieves page items for csdeals
         """
-        self.form_data["page"] = page
-        try:
-            req = requests.post(url=self.url, data=self.form_data, headers=self.headers)
-        except HTTPError as error:
-            print(
-                textwrap.dedent(
-                    f"""\
-                failed while scraping CSDeals page {page}
-                error code: {error.code},
-                reason - {error.reason}
-                """
-                )
-            )
-            return None
-        try:
-            data = req.json()["response"]["results"]["252490"]
+        # copied since pages are fetched concurrently
+        form_data = dict(self.form_data, page=page)
+        page_items = None
+        for atempt in range(3):
+            try:
+                async with session.post(
+                    self.url,
+                    data=form_data,
+                    headers=self.headers,
+                    raise_for_status=True,
+                ) as response:
+                    # items are parsed one at a time straight from the response stream
+                    items = []
+                    async for item in ijson.items(
+                        response.content, "response.results.252490.item", use_float=True
+                    ):
+                        price = round(float(item["i"]) * self.conversion_rate, 2)
+                        if not self.min_price < price < self.max_price:
+                            continue
+                        name = item["c"]
+                        url = f"https://cs.deals/market/?name={_encode_url_string(name)}&sort=price"
+                        items.append(CSDealsItem(name=name, price=price, url=url))
+                    page_items = items
 
-            items = []
-            for item in data:
-                name = item["c"]
-                price = round(float(item["i"]) * self.conversion_rate, 2)
-                url = f"https://cs.deals/market/?name={_encode_url_string(name)}&sort=price"
-                new_item = CSDealsItem(name=name, price=price, url=url)
-                if price > self.min_price and price < self.max_price:
-                    items.append(new_item)
-        except Exception as exc:
-            raise exc
+                break
+            except aiohttp.ClientResponseError as error:
+                if atempt >= 2:
+                    print(
+                        textwrap.dedent(
+                            f"""\
+                        failed while scraping CSDeals page {page}
+                        error code: {error.status},
+                        reason - {error.message}
+                        """
+                        )
+                    )
+                else:
+                    await asyncio.sleep(_retry_delay(error, atempt))
+                    continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # timeouts, connection resets and dns failures
+                if atempt >= 2:
+                    print(
+                        textwrap.dedent(
+                            f"""\
+                        failed while scraping CSDeals page {page}
+                        reason - {error!r}
+                        """
+                        )
+                    )
+                else:
+                    await asyncio.sleep(_retry_delay(error, atempt))
+                    continue
 
-        return items
+        return page_items
+
+
+_SKINPORT_HEADERS = {
+    "accept": "application/json, text/plain, */*",
+    "accept-language": "en-US,en;q=0.9",
+    "referer": "https://skinport.com/rust/market?pricegt=138&pricelt=156900&sort=percent&order=desc",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.5060.114 Safari/537.36 OPR/89.0.4447.64",
+    "cookie": "_csrf=",
+}
+# _SKINPORT_URL = "https://app.skinport.com/browse/252490?pricegt={}&pricelt={}&sort={}&order={}&skip={}" # old
+_SKINPORT_URL = "https://skinport.com/api/browse/252490?pricegt={}&pricelt={}&sort={}&order={}&skip={}"
 
 
 class Skinport(ThirdPartyMarket):
@@ -306,6 +749,9 @@ class Skinport(ThirdPartyMarket):
     scraper class for https://skinport.com
     """
 
+    headers = _SKINPORT_HEADERS
+    url = _SKINPORT_URL
+
     def __init__(
         self,
         sortby: str = "date",
@@ -324,74 +770,74 @@ class Skinport(ThirdPartyMarket):
             price_max : int = 10000
                 maximum price for items 10000 = 100.00€
         """
-        self.headers = {
-            "accept": "application/json, text/plain, */*",
-            "accept-language": "en-US,en;q=0.9",
-            "referer": "https://skinport.com/rust/market?pricegt=138&pricelt=156900&sort=percent&order=desc",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.5060.114 Safari/537.36 OPR/89.0.4447.64",
-            "cookie": "_csrf=",
-        }
-
         self.sort_options = ["sale", "popular", "percent", "price", "wear", "date"]
         self.sort_by = sortby
         self.order = order
         self.price_min = price_min
         self.price_max = price_max
 
-        # self.url = "https://app.skinport.com/browse/252490?pricegt={}&pricelt={}&sort={}&order={}&skip={}" # old
-        self.url = "https://skinport.com/api/browse/252490?pricegt={}&pricelt={}&sort={}&order={}&skip={}"
-
-    def get_page_items(self, page) -> Optional[List[SkinportItem]]:
+    async def get_page_items(
+        self, session: aiohttp.ClientSession, page: int
+    ) -> Optional[List[SkinportItem]]:
         """
         function to get all items from Skinport page
         """
-        page_html = None
-        response = None
+        page_items = None
         formated_url = self.url.format(
             self.price_min, self.price_max, self.sort_by, self.order, page
         )
         for atempt in range(3):
             try:
-                req = Request(formated_url, headers=self.headers)
-                response = urlopen(req, timeout=500)
-                page_html = response.read()
+                async with session.get(
+                    formated_url,
+                    headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=500),
+                    raise_for_status=True,
+                ) as response:
+                    # items are parsed one at a time straight from the response stream
+                    page_items = [
+                        SkinportItem(
+                            name=item["marketName"],
+                            price=item["salePrice"] / 100,
+                            suggested_price=item["suggestedPrice"] / 100,
+                            url=f"https://skinport.com/market/252490?search={item['url']}",
+                        )
+                        async for item in ijson.items(
+                            response.content, "items.item", use_float=True
+                        )
+                    ]
 
                 break
-            except HTTPError as error:
+            except aiohttp.ClientResponseError as error:
                 if atempt >= 2:
                     print(
                         textwrap.dedent(
                             f"""\
                         failed while scraping Skinport page {page}
-                        error code: {error.code},
-                        reason - {error.reason}
+                        error code: {error.status},
+                        reason - {error.message}
                         """
                         )
                     )
                 else:
-                    sleep(1)
+                    await asyncio.sleep(_retry_delay(error, atempt))
                     continue
-            finally:
-                if response:
-                    response.close()
-
-        if page_html:
-            page_soup = Soup(page_html, "html.parser")
-            text = json.loads(page_soup.getText())
-
-            page_items = []
-            for item in text["items"]:
-                page_items.append(
-                    SkinportItem(
-                        name=item["marketName"],
-                        price=item["salePrice"] / 100,
-                        suggested_price=item["suggestedPrice"] / 100,
-                        url=f"https://skinport.com/market/252490?search={item['url']}",
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # timeouts, connection resets and dns failures
+                if atempt >= 2:
+                    print(
+                        textwrap.dedent(
+                            f"""\
+                        failed while scraping Skinport page {page}
+                        reason - {error!r}
+                        """
+                        )
                     )
-                )
+                else:
+                    await asyncio.sleep(_retry_delay(error, atempt))
+                    continue
 
-            return page_items
-        return None
+        return page_items
 
 
 #
@@ -405,7 +851,7 @@ def tax_calculation(price) -> float:
     5 % price difference in price of cashout items between steam and skinport
     12 % skinport sale cut
     """
-    return round(round(price * 0.98 * 0.87, 2) * 0.95 * 0.88, 2)
+    return round(price * 0.98 * 0.87 * 0.95 * 0.88, 2)
 
 
 @dataclass
@@ -420,7 +866,7 @@ class Alert:
 
     def __post_init__(self):
         self.sell_even = round(self.market_item.price * 1.13 * 1.12 * 1.12, 2)
-        self.profit = tax_calculation(self.steam_price.lowest_price)
+        self.profit = self.steam_price.taxed_price
 
     def __str__(self) -> str:
         return (
@@ -453,6 +899,9 @@ class Scraper:
         self.steam_market = steam_market
         self.price_history = price_history
         self.alerts = {}
+        # deals file is kept open until close(), line buffered so alerts are written as they come
+        self._deals_file = open("deals.txt", "a", buffering=1)
+        self.page_limiter = AsyncLimiter(20, 60)
 
     def scrape(
         self, total_pages: int = 20, verbose: bool = False, play_sound=True
@@ -466,96 +915,155 @@ class Scraper:
             verbose : bool = False
                 if True prints item name trying to be retrieved from steam to console
         """
+        asyncio.run(self._scrape(total_pages, verbose, play_sound))
+
+    async def _scrape(self, total_pages: int, verbose: bool, play_sound: bool) -> None:
         print("Starting scraper")
-        for page in range(0, total_pages + 1):
-            print(f"getting page {page}")
-            market_items = self.third_party_market.get_page_items(page)
-            if not market_items:
-                print("failed getting page items")
-                continue
-            for c, market_item in enumerate(market_items):
-                # checks if item already exist in price data and is up to date, if not updates it
-                if not self.price_history.check_item(market_item.name):
-                    if verbose:
-                        print(f'getting steam price for ["{market_item.name}"]')
-                    steam_price = self.steam_market.get_steam_price(market_item.name)
-                    self.price_history.update_data(market_item.name, steam_price)
-                    sleep(randint(2, 5))
-
-                # saves the updated price history periodicaly
-                if c % 10:
-                    self.price_history.save_data()
-
-                # gets steam price and compares skinport price to steam price
-                steam_price = self.price_history.get_item_info(market_item.name)
-                if not steam_price:
+        # one connection pool is shared by every request of the run so connections are kept alive between requests,
+        # limit_per_host bounds how many requests to one market are in flight at once
+        connector = aiohttp.TCPConnector(
+            limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=60
+        )
+        # socket timeouts rather than a total one, time spent queued for a pooled connection doesn't count
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            # pages are fetched in the background and processed in the order they arrive
+            page_semaphore = asyncio.Semaphore(4)
+            pages = [
+                self._get_page(session, page_semaphore, page)
+                for page in range(0, total_pages + 1)
+            ]
+            # names known to be up to date, so items don't have to be checked one by one against the price history
+            fresh_names = self.price_history.fresh_names_snapshot()
+            for next_page in asyncio.as_completed(pages):
+                page, market_items = await next_page
+                if not market_items:
+                    print(f"failed getting page {page} items")
                     continue
 
-                percentage = self.compare_price(market_item, steam_price)
-                # if profit percentage exceeds certain threshold generates an alert and prints to terminal
-                if percentage > self.percent_threshold:
-                    try:
-                        alert = Alert(market_item, steam_price, percentage)
-                        if market_item.name not in self.alerts.keys():
-                            self.alerts[market_item.name] = [alert]
-                            print("#" * 10, "ALERT!", "#" * 10)
-                            print(alert)
-
-                            # playing alert sound
-                            if play_sound:
-                                playsound("alert.mp3", block=True)
-                        else:
-                            self.alerts[market_item.name].append(alert)
-
-                        self.write_alert_to_file(alert)
-
-                    except Exception as e:
-                        print(e)
-
-            self.price_history.save_data()  # saves updates steam prices every page
-
-            print("waiting...")
-            sleep(randint(2, 5))
+                # checks which items don't exist in price data or are outdated and updates them concurrently
+                missing_names = [
+                    name
+                    for name in dict.fromkeys(item.name for item in market_items)
+                    if name not in fresh_names
+                ]
+                if verbose:
+                    for name in missing_names:
+                        print(f'getting steam price for ["{name}"]')
+                steam_prices = await asyncio.gather(
+                    *(
+                        self.steam_market.get_steam_price(session, name)
+                        for name in missing_names
+                    ),
+                    return_exceptions=True,
+                )
+                failed_names = set()
+                for name, steam_price in zip(missing_names, steam_prices):
+                    if isinstance(steam_price, RequestFailed):
+                        # not stored so the item is requested again instead of being saved as having no price
+                        failed_names.add(name)
+                    elif isinstance(steam_price, BaseException):
+                        raise steam_price
+                    else:
+                        self.price_history.update_data(name, steam_price)
+                        fresh_names.add(name)
+
+                for market_item in market_items:
+                    if market_item.name in failed_names:
+                        continue
+                    # gets taxed steam price and compares skinport price to it
+                    taxed_price = self.price_history.get_taxed_price(market_item.name)
+                    if not taxed_price:
+                        continue
+
+                    percentage = self.compare_price(market_item, taxed_price)
+                    # if profit percentage exceeds certain threshold generates an alert and prints to terminal
+                    if percentage > self.percent_threshold:
+                        try:
+                            steam_price = self.price_history.get_item_info(
+                                market_item.name
+                            )
+                            alert = Alert(market_item, steam_price, percentage)
+                            if market_item.name not in self.alerts:
+                                self.alerts[market_item.name] = [alert]
+                                print("#" * 10, "ALERT!", "#" * 10)
+                                print(alert)
+
+                                # playing alert sound in the background so scraping isn't blocked
+                                if play_sound:
+                                    threading.Thread(
+                                        target=playsound,
+                                        args=("alert.mp3",),
+                                        daemon=True,
+                                    ).start()
+                            else:
+                                self.alerts[market_item.name].append(alert)
+
+                            self.write_alert_to_file(alert)
+
+                        except Exception as e:
+                            print(e)
+
+        self.price_history.save_data()  # compacts the journaled updates into the price history file
 
         print("done!")
         print(f"found {len(self.alerts)} alerts")
         print("-" * 150)
-        for _, alert in self.alerts.items():  # printing all alerts
+        for alert in self.alerts.values():  # printing all alerts
             print(alert[0])
 
+    async def _get_page(
+        self,
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        page: int,
+    ) -> Tuple[int, Optional[List[ThirdPartyMarketItem]]]:
+        """
+        fetches third party market page, at most as many pages at once as the semaphore allows
+        """
+        async with semaphore, self.page_limiter:
+            print(f"getting page {page}")
+            return page, await self.third_party_market.get_page_items(session, page)
+
     def compare_price(
-        self, skinport_item: SkinportItem, steam_price: SteamPrice
+        self, skinport_item: ThirdPartyMarketItem, taxed_price: float
     ) -> float:
         """
-        compares price between skinport ant steam and returns percantage difference
+        compares price between skinport and taxed steam price and returns percantage difference
         """
-        return round(
-            (
-                tax_calculation(steam_price.lowest_price) / skinport_item.price * 100
-                - 100
-            ),
-            2,
-        )
+        return round(taxed_price / skinport_item.price * 100 - 100, 2)
 
     def write_alert_to_file(self, alert):
-        with open("deals.txt", "a") as f:
-            f.write(f"{alert}\n")
+        self._deals_file.write(f"{alert}\n")
+
+    def close(self) -> None:
+        """
+        closes the deals file
+        """
+        self._deals_file.close()
+
+    def __enter__(self) -> "Scraper":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
 
 def main():
     steam = SteamMarket()
-    history = PriceHistory(
-        price_history_file_path="steam_prices.pkl", up_to_date_days=3
-    )
     market = Skinport(sortby="date")  # Choose from [CSDeals(), Skinport()]
-    # market = CSDeals() # Cs deals stopped working because forex_python api is no longer available
-    scraper = Scraper(
+    # market = CSDeals()
+    with PriceHistory(
+        price_history_file_path="steam_prices.npz", up_to_date_days=3
+    ) as history, Scraper(
         percent_thershold=5,
         steam_market=steam,
         third_party_market=market,
         price_history=history,
-    )
-    scraper.scrape(total_pages=20, verbose=True, play_sound=True)
+    ) as scraper:
+        scraper.scrape(total_pages=20, verbose=True, play_sound=True)
 
 
 if __name__ == "__main__":